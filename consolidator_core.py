@@ -0,0 +1,220 @@
+"""Pipeline de consolidación (lectura, normalización, filtrado y serialización), sin dependencia de Streamlit."""
+import io
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import NamedTuple
+import pandas as pd
+
+# ===== Encabezados canónicos (alineados a los archivos de entrada) =====
+HEADERS = [
+    "NUMERO OBRA ICONSTRUYE",
+    "MES (MMM-AA)",
+    "APELLIDO PATERNO, APELLIDO MATERNO Y NOMBRES DEL TRABAJADOR",
+    "RUT TRABAJADOR (SIN PUNTOS Y CON GUION)",
+    "DIAS TRABAJADOS ",
+    "NUMERO DE CONTRATO",
+    "RAZON SOCIAL EMPRESA SUBCONTRATISTA ",
+    "RUT EMPRESA SUBCONTRATISTA (SIN PUNTOS Y CON GUION)",
+    "RAZON SOCIAL EMPRESA CONTRATISTA ",
+    "RUT EMPRESA CONTRATISTA (SIN PUNTOS Y CON GUION)",
+]
+ORDERED_COLS = ["File name"] + HEADERS
+
+# ===== Utilidades =====
+_WS_RE = re.compile(r"\s+")
+
+def normalize_header(name: str) -> str:
+    """Trim y colapso de espacios internos (sin cambiar el texto base)."""
+    if not isinstance(name, str):
+        return ""
+    return _WS_RE.sub(" ", name).strip()
+
+# Encabezados normalizados y mapa de vuelta al nombre canónico (se calculan una sola vez)
+NORM_HEADERS = [normalize_header(h) for h in HEADERS]
+BACKMAP = {normalize_header(h): h for h in HEADERS}
+
+# Texto respaldado por Arrow: bytes contiguos y strip/comparación/concat en código nativo
+TEXT_DTYPE = "string[pyarrow]"
+
+def trim_text_df(df: pd.DataFrame) -> pd.DataFrame:
+    """Recorta espacios en las columnas de texto (ya en TEXT_DTYPE, con kernels de Arrow)."""
+    for c in df.columns:
+        df[c] = df[c].str.strip()
+    return df
+
+def excel_to_bytes(df: pd.DataFrame) -> bytes:
+    buf = io.BytesIO()
+    # strings_to_*: sin detección por celda (todo es texto). No usar constant_memory: to_excel
+    # escribe por columnas y ese modo descarta lo escrito en filas ya volcadas.
+    options = {
+        "strings_to_numbers": False,
+        "strings_to_formulas": False,
+        "strings_to_urls": False,
+    }
+    with pd.ExcelWriter(buf, engine="xlsxwriter", engine_kwargs={"options": options}) as w:
+        df.to_excel(w, index=False)
+    buf.seek(0)
+    return buf.read()
+
+def to_parquet_bytes(df: pd.DataFrame) -> bytes:
+    buf = io.BytesIO()
+    df.to_parquet(buf, engine="pyarrow", compression="snappy", index=False)
+    return buf.getvalue()
+
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    return df.to_csv(index=False).encode("utf-8")
+
+# Formato -> (serializador, nombre de archivo, MIME)
+OUTPUT_FORMATS = {
+    "xlsx": (excel_to_bytes, "unificado.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "parquet": (to_parquet_bytes, "unificado.parquet", "application/vnd.apache.parquet"),
+    "csv": (to_csv_bytes, "unificado.csv", "text/csv"),
+}
+
+def read_excel_sheet(file, sheet_pref: str) -> pd.DataFrame:
+    """Lee la hoja preferida si existe; si no, la primera."""
+    xls = pd.ExcelFile(file, engine="calamine")
+    sheet = sheet_pref if sheet_pref in xls.sheet_names else xls.sheet_names[0]
+    return pd.read_excel(xls, sheet_name=sheet, dtype=str)
+
+def excel_sheet_names(data: bytes) -> list[str]:
+    return pd.ExcelFile(io.BytesIO(data), engine="calamine").sheet_names
+
+# Filas por bloque al leer CSV: acota el DataFrame intermedio sin recortar al tamaño del bloque
+# (el archivo completo sigue en memoria como bytes y el resultado se concatena entero)
+CSV_CHUNKSIZE = 100_000
+
+# Bloque ajustado por shape_frame: (tmp, columnas faltantes, filas descartadas)
+Part = tuple[pd.DataFrame, list[str], int]
+
+def shape_frame(df: pd.DataFrame, name: str, do_trim: bool) -> Part:
+    """Ajusta un bloque leído al esquema de salida. Devuelve (tmp, columnas faltantes, filas descartadas)."""
+    # 2) Normalizar encabezados suaves
+    norm_map = {c: normalize_header(c) for c in df.columns}
+    df = df.rename(columns=norm_map)
+
+    # 3-4) Seleccionar columnas presentes (según nombre normalizado)
+    input_cols = set(df.columns)
+    present_norm = [h for h in NORM_HEADERS if h in input_cols]
+    missing = [BACKMAP[h] for h in NORM_HEADERS if h not in input_cols]
+
+    # 5-6) Volver al nombre canónico, crear columnas faltantes vacías y fijar el orden final
+    tmp = df.loc[:, present_norm].rename(columns=BACKMAP)
+    tmp = tmp.reindex(columns=ORDERED_COLS, fill_value=pd.NA)
+    tmp["File name"] = name
+    tmp = tmp.astype(TEXT_DTYPE)
+
+    # 7) Limpiar textos y filtrar filas sin NUMERO OBRA ICONSTRUYE
+    if do_trim:
+        tmp = trim_text_df(tmp)
+    before = len(tmp)
+    # La columna clave se recorta siempre, aunque se omita el recorte completo
+    obra = tmp["NUMERO OBRA ICONSTRUYE"].str.strip().fillna("").to_numpy()
+    tmp = tmp.loc[obra != ""]
+    return tmp, missing, before - len(tmp)
+
+class ReadOptions(NamedTuple):
+    """Opciones de lectura que se pasan a los lectores de READERS."""
+    sheet_pref: str
+    csv_sep: str
+    csv_enc: str
+    do_trim: bool
+
+def _read_csv(name: str, data: bytes, opts: ReadOptions) -> list[Part]:
+    """CSV por bloques, ajustando cada uno antes de acumularlo (siempre hay al menos un bloque)."""
+    # El motor C solo admite separadores de un carácter; los multi-carácter requieren el motor python
+    engine = "c" if len(opts.csv_sep) == 1 else "python"
+    reader = pd.read_csv(
+        io.BytesIO(data),
+        dtype=str,
+        chunksize=CSV_CHUNKSIZE,
+        skip_blank_lines=True,
+        encoding=opts.csv_enc,
+        sep=opts.csv_sep,
+        engine=engine,
+    )
+    with reader:
+        return [shape_frame(chunk, name, opts.do_trim) for chunk in reader]
+
+def _read_excel(name: str, data: bytes, opts: ReadOptions) -> list[Part]:
+    """Excel (.xlsx/.xls vía calamine); sin recorte de espacios: Excel no trae relleno."""
+    return [shape_frame(read_excel_sheet(io.BytesIO(data), opts.sheet_pref), name, False)]
+
+# Extensión -> lector; cada lector devuelve la lista de bloques ya ajustados por shape_frame
+READERS = {
+    ".csv": _read_csv,
+    ".xlsx": _read_excel,
+    ".xls": _read_excel,
+}
+
+def process_file(
+    name: str, data: bytes, sheet_pref: str, csv_sep: str, csv_enc: str, do_trim: bool
+) -> tuple[pd.DataFrame, list[str]]:
+    """Lee, normaliza y filtra un archivo (name, bytes). Devuelve (tmp, advertencias)."""
+    file_warnings = []
+
+    # 1) Leer según la extensión
+    ext = Path(name).suffix.lower()
+    if ext not in READERS:
+        raise ValueError(f"extensión no soportada: {ext or '(sin extensión)'}")
+    parts = READERS[ext](name, data, ReadOptions(sheet_pref, csv_sep, csv_enc, do_trim))
+
+    tmp = pd.concat([p[0] for p in parts], ignore_index=True)
+    missing = parts[0][1]
+    removed = sum(p[2] for p in parts)
+    if removed > 0:
+        file_warnings.append(f"{name}: {removed} filas descartadas sin NUMERO OBRA ICONSTRUYE")
+
+    # 8) Advertencias de columnas faltantes
+    if missing:
+        file_warnings.append(f"{name}: faltan columnas -> {', '.join(missing)}")
+
+    return tmp, file_warnings
+
+def process_uploads(
+    jobs: list[tuple[str, bytes, str]],
+    *,
+    csv_sep: str,
+    csv_enc: str,
+    do_trim: bool,
+    process=process_file,
+    on_progress=None,
+) -> tuple[pd.DataFrame, list[str]]:
+    """Procesa (name, data, sheet_pref) en paralelo y consolida en el orden de carga.
+
+    `process` permite inyectar una versión cacheada de process_file; `on_progress(done, total)`
+    se llama desde el hilo que invoca, a medida que termina cada archivo.
+    """
+    warnings_log = []
+    # Los resultados se guardan por posición para mantener el orden de carga
+    results = [None] * len(jobs)
+    with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as pool:
+        futures = {
+            pool.submit(process, name, data, sheet_pref, csv_sep, csv_enc, do_trim): idx
+            for idx, (name, data, sheet_pref) in enumerate(jobs)
+        }
+        for i, fut in enumerate(as_completed(futures), start=1):
+            idx = futures[fut]
+            name = jobs[idx][0]
+            try:
+                results[idx] = fut.result()
+            except Exception as exn:
+                results[idx] = (None, [f"{name}: ERROR al procesar -> {exn}"])
+            if on_progress is not None:
+                on_progress(i, len(jobs))
+
+    # Acumular y concatenar una sola vez
+    frames = []
+    for tmp, file_warnings in results:
+        if tmp is not None:
+            frames.append(tmp)
+        warnings_log.extend(file_warnings)
+
+    df_out = (
+        pd.concat(frames, ignore_index=True)
+        if frames
+        else pd.DataFrame(columns=ORDERED_COLS, dtype=TEXT_DTYPE)
+    )
+    return df_out, warnings_log
@@ -0,0 +1,109 @@
+import io
+import time
+
+import pandas as pd
+
+import consolidator_core
+from consolidator_core import (
+    ORDERED_COLS,
+    OUTPUT_FORMATS,
+    TEXT_DTYPE,
+    excel_to_bytes,
+    process_file,
+    process_uploads,
+    to_csv_bytes,
+    to_parquet_bytes,
+)
+
+
+def _sample_frame() -> pd.DataFrame:
+    return pd.DataFrame(
+        [[f"{c}-{r}" for c in range(len(ORDERED_COLS))] for r in range(4)],
+        columns=ORDERED_COLS,
+        dtype=TEXT_DTYPE,
+    )
+
+
+def test_excel_to_bytes_round_trip():
+    df = _sample_frame()
+    back = pd.read_excel(io.BytesIO(excel_to_bytes(df)), dtype=str).astype(TEXT_DTYPE)
+    pd.testing.assert_frame_equal(back, df)
+
+
+def test_process_file_drops_blank_obra_in_excel():
+    df = pd.DataFrame({"NUMERO OBRA ICONSTRUYE": ["101", " ", None], "MES (MMM-AA)": ["ene-24"] * 3})
+    buf = io.BytesIO()
+    df.to_excel(buf, index=False, sheet_name="BBDD")
+    tmp, file_warnings = process_file("a.xlsx", buf.getvalue(), "BBDD", ",", "utf-8", False)
+    assert tmp["NUMERO OBRA ICONSTRUYE"].tolist() == ["101"]
+    assert "a.xlsx: 2 filas descartadas sin NUMERO OBRA ICONSTRUYE" in file_warnings
+
+
+def test_process_file_header_only_csv():
+    tmp, file_warnings = process_file("b.csv", b"NUMERO OBRA ICONSTRUYE\n", "BBDD", ",", "utf-8", True)
+    assert tmp.empty
+    assert list(tmp.columns) == ORDERED_COLS
+    assert any("faltan columnas" in w for w in file_warnings)
+
+
+def test_process_file_csv_chunks(monkeypatch):
+    monkeypatch.setattr(consolidator_core, "CSV_CHUNKSIZE", 2)
+    data = b"NUMERO OBRA ICONSTRUYE,MES (MMM-AA)\n1,ene-24\n,ene-24\n ,feb-24\n4,feb-24\n,mar-24\n6,mar-24\n"
+    tmp, file_warnings = process_file("c.csv", data, "BBDD", ",", "utf-8", True)
+    assert tmp["NUMERO OBRA ICONSTRUYE"].tolist() == ["1", "4", "6"]
+    assert tmp.index.equals(pd.RangeIndex(3))
+    assert "c.csv: 3 filas descartadas sin NUMERO OBRA ICONSTRUYE" in file_warnings
+    assert sum("faltan columnas" in w for w in file_warnings) == 1
+
+
+def test_process_uploads_keeps_order_and_logs_errors():
+    def fake_process(name, data, sheet_pref, csv_sep, csv_enc, do_trim):
+        if name == "a.csv":
+            time.sleep(0.2)
+        if name == "b.csv":
+            raise ValueError("boom")
+        tmp = pd.DataFrame({"File name": [name]}).reindex(columns=ORDERED_COLS).astype(TEXT_DTYPE)
+        return tmp, [f"{name}: ok"]
+
+    done = []
+    jobs = [(n, b"", "BBDD") for n in ["a.csv", "b.csv", "c.csv"]]
+    df_out, warnings_log = process_uploads(
+        jobs,
+        csv_sep=",",
+        csv_enc="utf-8",
+        do_trim=True,
+        process=fake_process,
+        on_progress=lambda i, total: done.append((i, total)),
+    )
+    assert df_out["File name"].tolist() == ["a.csv", "c.csv"]
+    assert warnings_log == ["a.csv: ok", "b.csv: ERROR al procesar -> boom", "c.csv: ok"]
+    assert done == [(1, 3), (2, 3), (3, 3)]
+
+
+def test_to_parquet_bytes_round_trip():
+    df = _sample_frame()
+    back = pd.read_parquet(io.BytesIO(to_parquet_bytes(df)))
+    pd.testing.assert_frame_equal(back, df)
+
+
+def test_to_csv_bytes_round_trip():
+    df = _sample_frame()
+    back = pd.read_csv(io.BytesIO(to_csv_bytes(df)), dtype=str).astype(TEXT_DTYPE)
+    pd.testing.assert_frame_equal(back, df)
+
+
+def test_output_formats_cover_serializers():
+    assert OUTPUT_FORMATS["xlsx"][0] is excel_to_bytes
+    assert OUTPUT_FORMATS["parquet"][0] is to_parquet_bytes
+    assert OUTPUT_FORMATS["csv"][0] is to_csv_bytes
+
+
+def test_process_uploads_empty():
+    df_out, warnings_log = process_uploads([], csv_sep=",", csv_enc="utf-8", do_trim=True)
+    assert df_out.empty
+    assert list(df_out.columns) == ORDERED_COLS
+    assert (df_out.dtypes == TEXT_DTYPE).all()
+    assert warnings_log == []
+    # El consolidado vacío también debe poder descargarse en cada formato
+    for to_bytes, _, _ in OUTPUT_FORMATS.values():
+        assert to_bytes(df_out)